@@ -0,0 +1,129 @@
+from shape import ConvexShape, registerShape, tooThin
+import numpy
+import math
+
+"""
+Author: Thomas Elgin (https://github.com/telgin)
+"""
+
+def isConvex(points):
+    """
+    Tells if the points make a convex polygon without crossing edges. Every turn
+    must be in the same direction and the turns must add up to one full turn.
+    :param points: An Nx2 array of points
+    :return: True if the polygon is convex, False otherwise
+    """
+    points = numpy.asarray(points, dtype=float)
+    edges = numpy.roll(points, -1, axis=0) - points
+    following = numpy.roll(edges, -1, axis=0)
+
+    cross = edges[:, 0] * following[:, 1] - edges[:, 1] * following[:, 0]
+    if not ((cross > 0).all() or (cross < 0).all()):
+        return False
+
+    dot = edges[:, 0] * following[:, 0] + edges[:, 1] * following[:, 1]
+    turning = numpy.sum(numpy.arctan2(cross, dot))
+    return abs(abs(turning) - 2 * math.pi) < 1e-6
+
+
+class ConvexPolygon(ConvexShape):
+    """
+    Convex polygon implementation with any number of sides. Subclasses
+    set the number of sides.
+    """
+
+    sides = 5
+
+    def randomizePoints(self):
+        """
+        Randomizes the points, essentially creating a new small convex polygon
+        somewhere within the bounds of the image
+        """
+
+        # keep points close to the center (start with small shape)
+        modRange = 15
+
+        # a small radius rounds several vertices onto the same or collinear pixels
+        minRadius = self.sides
+
+        # (python do-while) rounding can still leave a degenerate polygon, so try again
+        # until it is convex and not too thin. Only images smaller than the shape run out
+        # of attempts, in which case the last try is kept and scored as invalid.
+        for attempt in range(100):
+            radius = self.rng.randint(minRadius, max(minRadius, modRange)+1)
+
+            # pick a random center which keeps the circle on the image
+            center = [self.rng.randint(radius, max(radius+1, self.imageBounds[0]-radius)),
+                      self.rng.randint(radius, max(radius+1, self.imageBounds[1]-radius))]
+
+            # vertices at evenly spaced angles with some jitter, so no two are too close
+            angles = (numpy.arange(self.sides) + (self.rng.random_sample(self.sides) - .5) * .6) * \
+                     2 * math.pi / self.sides + self.rng.random_sample() * 2 * math.pi
+
+            points = numpy.transpose([center[0] + radius * numpy.cos(angles), center[1] + radius * numpy.sin(angles)])
+            points = numpy.round(points).astype(numpy.int64)
+            points[:, 0] = numpy.clip(points[:, 0], 0, self.imageBounds[0]-1)
+            points[:, 1] = numpy.clip(points[:, 1], 0, self.imageBounds[1]-1)
+
+            if isConvex(points) and not tooThin(points):
+                break
+
+        self.points = points
+
+    def mutate(self, heat=10):
+        """
+        Redefine mutate so the polygon stays convex. This will move one vertex, translate,
+        or scale the vertices randomly, trying again if the result is not convex or leaves the image.
+        :param heat: The length of the range of the random number. The range
+        is centered on the current number.
+        """
+
+        # must have this in order to allow undoMutate
+        self.oldPoints = numpy.copy(self.points)
+
+        for attempt in range(10):
+            choice = self.rng.randint(3)
+
+            if choice == 0: # move a vertex
+                delta = numpy.zeros(self.points.shape)
+                delta[self.rng.randint(len(self.points))] = self.rng.randint(0, heat+1, 2) - (heat//2)
+                points = self.points + delta
+
+            elif choice == 1: # translate
+                points = self.points + (self.rng.randint(0, heat+1, 2) - (heat//2))
+
+            else: # scale
+                center = numpy.average(self.points, axis=0)
+                scale = 1 + (self.rng.random_sample() - .5) * heat / 100.
+                points = center + (self.points - center) * scale
+
+            points = numpy.round(points).astype(numpy.int64)
+            if self.pointsBounded(points) and isConvex(points):
+                self.points = points
+                return
+
+
+class Quadrilateral(ConvexPolygon):
+    """
+    Convex quadrilateral.
+    """
+    sides = 4
+
+
+class Pentagon(ConvexPolygon):
+    """
+    Convex pentagon.
+    """
+    sides = 5
+
+
+class Hexagon(ConvexPolygon):
+    """
+    Convex hexagon.
+    """
+    sides = 6
+
+
+registerShape('quadrilateral', Quadrilateral)
+registerShape('pentagon', Pentagon)
+registerShape('hexagon', Hexagon)
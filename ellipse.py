@@ -0,0 +1,45 @@
+from rectangle import RotatedRectangle
+from shape import registerShape
+import numpy
+import math
+
+"""
+Author: Thomas Elgin (https://github.com/telgin)
+"""
+
+class Ellipse(RotatedRectangle):
+    """
+    Ellipse implementation, approximated as a polygon. Uses the same parameters
+    as the rotated rectangle the ellipse is inscribed in.
+    """
+
+    # number of vertices of the polygon approximating the ellipse
+    vertices = 16
+
+    def outline(self, params, t):
+        """
+        Computes points on the outline of the ellipse before rotation
+        :param params: The shape parameters
+        :param t: An array of angles around the center
+        :return: The x and y offsets from the center
+        """
+        return numpy.cos(t) * params[2], numpy.sin(t) * params[3]
+
+    def outlineAngles(self):
+        """
+        Gets the angles around the center of the vertices
+        :return: An array of angles
+        """
+        return numpy.arange(self.vertices) * 2 * math.pi / self.vertices
+
+    def anglePoints(self):
+        """
+        Neighboring vertices of an ellipse are close to a straight line, so check the points
+        on the ellipse at the diagonals instead. They make a rectangle with the same proportions
+        as the ellipse, which limits how stretched the ellipse can be.
+        :return: The four points on the ellipse at the diagonals
+        """
+        return self.computePoints(self.params, RotatedRectangle.outlineAngles(self))
+
+
+registerShape('ellipse', Ellipse)
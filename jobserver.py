@@ -0,0 +1,315 @@
+from PIL import Image
+from polygonapi import fitImage, getShapeType
+import multiprocessing
+import threading
+import itertools
+import collections
+import Queue
+import time
+import io
+
+"""
+Author: Thomas Elgin (https://github.com/telgin)
+"""
+
+# job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+def runJob(imageData, shape, savepoints, options, events):
+    """
+    Fits a job's image in a worker process. Runs without the inner multiprocessing pool
+    so each job uses exactly one core. Results are sent back through the events queue.
+    :param imageData: The bytes of the target image file
+    :param shape: The name of the shape type
+    :param savepoints: A list of the numbers of shapes to send an SVG at
+    :param options: Keyword arguments passed on to fitImage
+    :param events: A multiprocessing queue to put (event, data) tuples on
+    """
+    try:
+        img = Image.open(io.BytesIO(imageData))
+        for count, model in fitImage(img, savepoints, shape, parallel=False, **options):
+            events.put(('savepoint', (count, model.toSVG())))
+        events.put((DONE, None))
+    except Exception as e:
+        events.put((FAILED, repr(e)))
+
+
+class Job:
+    """
+    A request to fit shapes to an image. Progress is streamed through events(), which
+    yields (event, data) tuples where the event is 'savepoint' (data is the shape count
+    and the SVG bytes) or the final state of the job. Savepoints are only kept until
+    they are read from events().
+    """
+
+    def __init__(self, jobId, imageData, shape, savepoints, priority, options):
+        self.id = jobId
+        self.imageData = imageData
+        self.shape = shape
+        self.savepoints = sorted(savepoints)
+        self.priority = priority
+        self.options = options
+        self.state = QUEUED
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+
+    def events(self, timeout=None):
+        """
+        Streams the events of this job, blocking until each one is available
+        :param timeout: Seconds to wait for each event, None waits forever
+        :return: Yields (event, data) tuples, ending after the final state
+        """
+        while True:
+            event = self.queue.get(timeout=timeout)
+            yield event
+            if event[0] in (DONE, CANCELLED, FAILED):
+                # put it back so other listeners also see the end
+                self.queue.put(event)
+                return
+
+    def finish(self, state, data=None):
+        """
+        Moves the job to a final state and notifies listeners
+        :param state: DONE, CANCELLED or FAILED
+        :param data: The error message for FAILED jobs
+        """
+        self.state = state
+        self.error = data
+        self.finished = time.time()
+        self.imageData = None
+        self.queue.put((state, data))
+
+
+class JobServer:
+    """
+    Runs fitting jobs on a bounded number of worker processes. Jobs wait in a priority
+    queue (higher priority first, then in order of submission) until a worker is free.
+    Each running job has its own process, so it can be cancelled at any time.
+    Finished jobs are kept for lookup until forget() is called or more than
+    the retained number of jobs have finished after them.
+    """
+
+    def __init__(self, processes=None, retain=100):
+        """
+        Starts the dispatcher threads
+        :param processes: The number of jobs to run at once, defaults to the number of cores
+        :param retain: The number of finished jobs to keep
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        self.processes = processes
+        self.retain = retain
+        self.pending = Queue.PriorityQueue()
+        self.jobs = {}
+        self.retired = collections.deque()
+        self.queued = 0
+        self.ids = itertools.count(1)
+        self.started = time.time()
+        self.completed = 0
+        self.shapesFit = 0
+        self.running = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.workers = []
+        for i in range(processes):
+            worker = threading.Thread(target=self.dispatch)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, imageData, shape, savepoints, priority=0, **options):
+        """
+        Queues a job
+        :param imageData: The bytes of the target image file
+        :param shape: The name of the shape type
+        :param savepoints: A list of the numbers of shapes to send an SVG at
+        :param priority: Jobs with a higher priority run first
+        :param options: Keyword arguments passed on to fitImage (cycles, alpha, ...)
+        :return: The job object
+        """
+        if self.closed:
+            raise RuntimeError('The job server is closed')
+
+        # check arguments here so bad jobs never take up a worker
+        getShapeType(shape)
+        savepoints = list(savepoints)
+        if len(savepoints) == 0 or min(savepoints) < 1:
+            raise ValueError('Savepoints must be a non-empty list of positive shape counts')
+
+        jobId = next(self.ids)
+        job = Job(jobId, imageData, shape, savepoints, priority, options)
+        with self.lock:
+            self.jobs[jobId] = job
+            self.queued += 1
+        self.pending.put((-priority, jobId, job))
+        return job
+
+    def cancel(self, jobId):
+        """
+        Cancels a job. Queued jobs are dropped and running jobs have their process terminated.
+        :param jobId: The id of the job
+        :return: True if the job was cancelled, False if it had already finished
+        """
+        with self.lock:
+            job = self.jobs.get(jobId)
+        if job is None:
+            raise ValueError('Unknown job id: ' + str(jobId) + '. It may have been forgotten.')
+
+        with job.lock:
+            if job.state == QUEUED:
+                self.retire(job, CANCELLED)
+                return True
+            elif job.state == RUNNING:
+                job.state = CANCELLED
+                job.process.terminate()
+                return True
+        return False
+
+    def dispatch(self):
+        """
+        Worker thread loop. Takes the next job from the queue and runs it in a new process.
+        """
+        while True:
+            priority, jobId, job = self.pending.get()
+            if job is None:
+                return
+
+            with job.lock:
+                if job.state != QUEUED:
+                    continue
+                with self.lock:
+                    self.queued -= 1
+                events = multiprocessing.Queue()
+                job.process = multiprocessing.Process(target=runJob,
+                    args=(job.imageData, job.shape, job.savepoints, job.options, events))
+                job.state = RUNNING
+                job.started = time.time()
+                job.process.start()
+
+            with self.lock:
+                self.running += 1
+            try:
+                self.follow(job, events)
+            except Exception as e:
+                with job.lock:
+                    if job.finished is None:
+                        self.retire(job, FAILED, repr(e))
+
+    def follow(self, job, events):
+        """
+        Passes events from a job's process on to the job until the process ends
+        :param job: The running job
+        :param events: The multiprocessing queue the process puts events on
+        """
+        while True:
+            try:
+                event, data = events.get(timeout=.5)
+            except Queue.Empty:
+                if job.process.is_alive():
+                    continue
+                try:
+                    # the final event may still be in the pipe after the process exits
+                    event, data = events.get(timeout=1)
+                except Queue.Empty:
+                    # the process is gone without a final event (cancelled or killed)
+                    event, data = FAILED, 'Worker process exited with code ' + str(job.process.exitcode)
+
+            with job.lock:
+                if event == 'savepoint' and job.state != CANCELLED:
+                    job.queue.put((event, data))
+                    continue
+
+                job.process.join()
+                job.process = None
+                if job.state == CANCELLED:
+                    self.retire(job, CANCELLED)
+                else:
+                    self.retire(job, event, data)
+                return
+
+    def retire(self, job, state, data=None):
+        """
+        Moves a job to a final state. The server's counts and the list of finished jobs
+        are updated before listeners are notified, so a listener which has seen the end
+        of a job can forget it straight away. The oldest finished jobs beyond the
+        retained number are dropped. Call with the job's lock held.
+        :param job: The job
+        :param state: DONE, CANCELLED or FAILED
+        :param data: The error message for FAILED jobs
+        """
+        with self.lock:
+            if job.state == QUEUED:
+                self.queued -= 1
+            else:
+                self.running -= 1
+
+            if state == DONE:
+                self.completed += 1
+                self.shapesFit += job.savepoints[-1]
+
+            self.retired.append(job.id)
+            while len(self.retired) > self.retain:
+                self.jobs.pop(self.retired.popleft(), None)
+
+        job.finish(state, data)
+
+    def forget(self, jobId):
+        """
+        Drops a finished job so its memory can be freed
+        :param jobId: The id of the job
+        :return: True if the job was dropped, False if it was not known (or already dropped)
+        """
+        with self.lock:
+            job = self.jobs.get(jobId)
+            if job is None:
+                return False
+            if jobId not in self.retired:
+                raise ValueError('Job ' + str(jobId) + ' has not finished, cancel it first')
+
+            self.retired.remove(jobId)
+            del self.jobs[jobId]
+            return True
+
+    def stats(self):
+        """
+        Reports the load of the server
+        :return: A dict with the queue depth, running job count, completed job count,
+        and the throughput in jobs and shapes per second since the server started
+        """
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-6)
+            return {'queued': self.queued,
+                    'running': self.running,
+                    'completed': self.completed,
+                    'jobs_per_second': self.completed / elapsed,
+                    'shapes_per_second': self.shapesFit / elapsed}
+
+    def close(self, cancel=False):
+        """
+        Stops accepting jobs and waits for the worker threads to finish
+        :param cancel: Cancel queued and running jobs instead of finishing them
+        """
+        self.closed = True
+        if cancel:
+            with self.lock:
+                jobIds = list(self.jobs.keys())
+            for jobId in jobIds:
+                self.cancel(jobId)
+
+        # sentinels sort after every real job so queued work still runs
+        for worker in self.workers:
+            self.pending.put((float('inf'), 0, None))
+        for worker in self.workers:
+            worker.join()
@@ -1,7 +1,9 @@
-from matplotlib import path
+from PIL import Image
+from shape import tooThin
 import numpy
 import svgwrite
-import math
+import copy
+import io
 
 """
 Author: Thomas Elgin (https://github.com/telgin)
@@ -80,10 +82,11 @@ class Model:
         return 'rgb(' + str(int(color[0])) + ',' + str(int(color[1])) + ',' + str(int(color[2])) + ')'
 
 
-    def writeSVG(self, path):
+    def mkSVG(self, path=None):
         """
-        Writes an svg of the shapes
-        :param path: The path of the svg to write
+        Builds an svg drawing of the shapes
+        :param path: The path the svg will be saved to, if any
+        :return: The svgwrite Drawing object
         """
 
         # compute inverse scale so the SVG is near the original image size
@@ -110,11 +113,59 @@ class Model:
             # add the SVG polygon object
             polygon = svg.polygon(points=polyPoints, fill=self.svgColor(shape.color), opacity=shape.color[3])
             shapes.add(polygon)
-        svg.save()
+
+        return svg
+
+
+    def writeSVG(self, path):
+        """
+        Writes an svg of the shapes
+        :param path: The path of the svg to write
+        """
+        self.mkSVG(path).save()
 
         print 'SVG saved to: ', path
 
 
+    def toSVG(self):
+        """
+        Renders an svg of the shapes in memory
+        :return: The svg document as utf-8 encoded bytes
+        """
+        svg = self.mkSVG().tostring()
+        if isinstance(svg, unicode):
+            svg = svg.encode('utf-8')
+        return svg
+
+
+    def toPNG(self, size=None):
+        """
+        Renders the current (working) image as a PNG in memory. This is the
+        low resolution approximation used for scoring, not the detail of an SVG.
+        :param size: Optional (width, height) to resize the image to
+        :return: The png image as bytes
+        """
+        img = Image.fromarray(numpy.uint8(self.current))
+        if size is not None:
+            img = img.resize(size)
+
+        buf = io.BytesIO()
+        img.save(buf, 'PNG')
+        return buf.getvalue()
+
+
+    def snapshot(self):
+        """
+        Copies the model so that it can be kept while fitting continues. The target
+        image is never modified, so it is shared with the copy.
+        :return: A new model object with copies of the current image and shapes
+        """
+        snap = copy.copy(self)
+        snap.current = numpy.copy(self.current)
+        snap.shapes = [copy.deepcopy(shape) for shape in self.shapes]
+        return snap
+
+
     def replaceSubsection(self, replacement, bounds, sample=False):
         """
         Replaces the current image (working copy) with a rectangle of data
@@ -140,6 +191,119 @@ class Model:
         return numpy.shape(self.target)[:2]
 
 
+    def similarity(self):
+        """
+        Computes how much the current (working) image looks like the target image
+        :return: The % similarity where 1 is exactly the same
+        """
+
+        # compute the difference between images
+        target_after_diff = self.target - self.current
+
+        channel_area = numpy.prod(numpy.shape(self.target[:,:,0]))
+        return 1 - (numpy.sum(numpy.abs(target_after_diff)) / float(channel_area*3*255))
+
+
+    def isThin(self, vertices):
+        """
+        Tells if a shape is too thin, meaning one of its angles is less than 4 degrees
+        :param vertices: The points of the shape
+        :return: True if the shape is too thin, False otherwise
+        """
+        return tooThin(vertices)
+
+
+    def shapeBounds(self, shape):
+        """
+        Gets the bounding rectangle of a shape
+        :param shape: The shape
+        :return: The bounds of the rectangle in the image [minx, maxx+1, miny, maxy+1]
+        """
+        maxx, maxy = numpy.max(shape.points, 0)
+        minx, miny = numpy.min(shape.points, 0)
+        return [int(minx), int(maxx)+1, int(miny), int(maxy)+1]
+
+
+    def shapeMask(self, shape, bounds):
+        """
+        Calculates which pixels of a rectangle of the image fall inside a shape
+        :param shape: The shape
+        :param bounds: The coordinates for the rectangle in the image
+        :return: A 2d logical array the size of the rectangle
+        """
+        mask = numpy.zeros([bounds[1]-bounds[0], bounds[3]-bounds[2]], dtype=bool)
+
+        # only look at the part of the shape's bounding rectangle within the bounds
+        shapeBounds = self.shapeBounds(shape)
+        minx, maxx = max(bounds[0], shapeBounds[0]), min(bounds[1], shapeBounds[1])
+        miny, maxy = max(bounds[2], shapeBounds[2]), min(bounds[3], shapeBounds[3])
+        if minx >= maxx or miny >= maxy:
+            return mask
+
+        area = (shapeBounds[1]-shapeBounds[0]) * (shapeBounds[3]-shapeBounds[2])
+        inside = shape.pixelMask([minx, maxx, miny, maxy], area)
+        mask[minx-bounds[0]:maxx-bounds[0], miny-bounds[2]:maxy-bounds[2]] = inside
+        return mask
+
+
+    def regionError(self, region, bounds):
+        """
+        Computes the difference between a rectangle of image data and the same rectangle
+        of the target image
+        :param region: The image data
+        :param bounds: The coordinates for the rectangle in the image
+        :return: The sum of absolute differences
+        """
+        target_region = self.target[bounds[0]:bounds[1], bounds[2]:bounds[3], :]
+        return numpy.sum(numpy.abs(target_region - region))
+
+
+    def renderRegion(self, bounds, shapes, boxes, fitShape=None, alpha=.5):
+        """
+        Renders a rectangle of the image from scratch by applying shapes in order on top of
+        the background. Only shapes whose bounding rectangles overlap the rectangle are drawn,
+        so changing a shape only requires re-rendering the area it covers.
+        :param bounds: The coordinates for the rectangle in the image
+        :param shapes: The shapes to apply, in compositing order
+        :param boxes: A numpy array of the bounds of each shape (see shapeBounds)
+        :param fitShape: A shape whose color is chosen here instead of using its current color.
+        The bounds must contain the whole shape.
+        :param alpha: The alpha value to be used when calculating color for fitShape
+        :return region: The rendered rectangle
+        :return color: The most optimal color for fitShape, None if it is not given or covers nothing
+        """
+        region = numpy.zeros([bounds[1]-bounds[0], bounds[3]-bounds[2], 3])
+        region[:, :] = self.background_color
+        target_region = self.target[bounds[0]:bounds[1], bounds[2]:bounds[3], :]
+        color = None
+
+        # find shapes overlapping the rectangle
+        overlapping = numpy.flatnonzero((boxes[:, 0] < bounds[1]) & (boxes[:, 1] > bounds[0]) &
+                                        (boxes[:, 2] < bounds[3]) & (boxes[:, 3] > bounds[2]))
+
+        for i in overlapping:
+            shape = shapes[i]
+            inside = self.shapeMask(shape, bounds)
+            inside_count = numpy.sum(inside)
+            if inside_count < 1:
+                continue
+
+            if shape is fitShape:
+                # same optimal color calculation as scoreShape, against the layers below this shape
+                target_avg_color = numpy.uint8(numpy.sum(target_region[inside], axis=0)/float(inside_count))
+                current_avg_color = numpy.uint8(numpy.sum(numpy.floor(region[inside]), axis=0)/float(inside_count))
+                color = (numpy.int16(target_avg_color) - ((1 - alpha) * current_avg_color)) / alpha
+                color = numpy.clip(color,0,255).astype(numpy.uint8)
+                shape_color, shape_alpha = color, alpha
+            else:
+                shape_color, shape_alpha = numpy.array(shape.color[:3]), shape.color[3]
+
+            # apply the shape the same way scoreShape does
+            region[inside] = numpy.uint8(numpy.int16(shape_alpha * shape_color + (1 - shape_alpha) * region[inside]))
+
+        return region, color
+
+
     def scoreShape(self, shape, alpha):
         """
         Scores a given shape according to how much the current (working) image looks
@@ -163,28 +327,11 @@ class Model:
 
         # there is a tendency to create very thin shapes at higher shape counts
         # give a bad score if the shape is too thin
-        int_vertices = numpy.ndarray.tolist(vertices.astype(numpy.int))
-        for v in range(len(int_vertices)): #I don't know how to do this without a loop
-            p1 = int_vertices[v]
-            p2 = int_vertices[((v+1)%len(int_vertices))]
-            p3 = int_vertices[((v+2)%len(int_vertices))]
-
-            angle = math.degrees(abs(math.atan2(p3[0]-p1[0], p3[1]-p1[1]) -
-                                     math.atan2(p2[0]-p1[0], p2[1]-p1[1])))
-
-            # if > 180, we want the other part
-            if angle > 180:
-                angle = abs(angle-360)
-
-            # all angles must be >= 4 degrees
-            if angle < 4:
-                return -1, None, None, None
+        if self.isThin(shape.anglePoints()):
+            return -1, None, None, None
 
         # calculate which pixels fall inside the shape
-        x, y = numpy.mgrid[minx:maxx + 1, miny:maxy + 1]
-        points = numpy.transpose(numpy.vstack([x.ravel(), y.ravel()]))
-        inside = path.Path(vertices).contains_points(points)
-        inside = numpy.reshape(inside, x.shape)
+        inside = shape.pixelMask([minx, maxx + 1, miny, maxy + 1], int(maxx - minx + 1) * int(maxy - miny + 1))
 
         # make 3d logical and integer representations of which points are inside/outside
         inside_3d = numpy.transpose(numpy.tile(inside, [3,1,1]), axes=[1, 2, 0])
@@ -228,13 +375,8 @@ class Model:
         current_region = numpy.copy(self.current[minx:maxx + 1, miny:maxy + 1, :])
         self.replaceSubsection(replacement, bounds)
 
-        # compute the difference between images
-        target_after_diff = self.target - self.current
-
         # compute the score of the current image (same as score for shape)
-        # this score is % similarity where 1 is exactly the same
-        channel_area = numpy.prod(numpy.shape(self.target[:,:,0]))
-        score = 1 - (numpy.sum(numpy.abs(target_after_diff)) / float(channel_area*3*255))
+        score = self.similarity()
 
         # undo applying this shape because we don't know if it will be used yet
         self.replaceSubsection(current_region, bounds)
@@ -1,8 +1,6 @@
 from PIL import Image
-from model import Model
 from shapefitting import *
-from square import Square
-from triangle import Triangle
+from polygonapi import shapetypes, createModel, loadShapeModule
 import os
 import argparse
 import sys
@@ -11,11 +9,6 @@ import sys
 Author: Thomas Elgin (https://github.com/telgin)
 """
 
-# define shapetypes
-shapetypes = {}
-shapetypes['square'] = Square
-shapetypes['triangle'] = Triangle
-
 def parseArgs():
     """
     Parse command line arguments
@@ -24,8 +17,12 @@ def parseArgs():
 
     parser = argparse.ArgumentParser(description='Polygon Composition Image Generator')
     parser.add_argument('target_image', help='Path to target image location.')
-    parser.add_argument('shape', type=str, help='Type of shape: ' + ', '.join(shapetypes.keys()))
+    parser.add_argument('shape', type=str, help='Type of shape: ' + ', '.join(sorted(shapetypes.keys())))
     parser.add_argument('polygons', metavar='N', type=int, nargs='+', help='Saves SVG files at these numbers of polygons.')
+    parser.add_argument('--refine', type=int, default=0, metavar='PASSES',
+                        help='Refinement passes over the fitted polygons at each save point.')
+    parser.add_argument('--shape-module', dest='shape_modules', action='append', default=[], metavar='MODULE',
+                        help='Imports a module which registers more shape types. May be repeated.')
 
     args = parser.parse_args(sys.argv[1:])
 
@@ -37,10 +34,18 @@ def parseArgs():
         exit()
     args.filename = os.path.basename(args.target_image).split('.')[0]
 
+    # plugins register their shape types when imported
+    for module in args.shape_modules:
+        try:
+            loadShapeModule(module)
+        except ImportError as e:
+            print 'Could not import shape module: ' + module + ' (' + str(e) + ')'
+            exit()
+
     args.shape = args.shape.lower()
     if args.shape not in shapetypes:
         print 'Invalid shape type: ' + args.shape
-        print 'Choose one of the following: ' + ', '.join(shapetypes.keys())
+        print 'Choose one of the following: ' + ', '.join(sorted(shapetypes.keys()))
         exit()
 
 
@@ -54,32 +59,13 @@ def main():
     args = parseArgs()
     img = Image.open(args.target_image)
 
-    # remove alpha component if it exists
-    if len(img.split()) == 4:
-        noa = Image.new("RGB", img.size, (255, 255, 255))
-        noa.paste(img, mask=img.split()[3])
-        img = noa
-
-    # calculate scaling factor:
-    # scaling the image down significantly reduces computation time and while I would normally
-    # be against this sort of thing, for this application you are not generally looking to
-    # output an image which includes the very fine detail anyways.
-    # ideally, largest image dimension is 315 (sort of tested, sort of arbitrary)
-    IDEAL_SIDE_SIZE = 315
-
-    max_side = max(img.size)
-    if max_side <= IDEAL_SIDE_SIZE:
-        scale_factor = 1
-    else:
-        scale_factor = IDEAL_SIDE_SIZE / float(max_side)
-
-    # create model
-    model = Model(img, scale=scale_factor)
+    # create model (removes any alpha component and scales the image down)
+    model = createModel(img)
 
     # fit polygons
     fitShapes(model, shapes=args.polygons, shapetype=shapetypes[args.shape], cycles=100, startHeat=100,
-        heatDiv=1.1, alpha=.5, savename=args.filename)
-
+        heatDiv=1.1, alpha=.5, savename=args.filename, refine=args.refine)
 
-main()
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+from PIL import Image
+from model import Model
+from shapefitting import fitShapesIter
+from shape import shapetypes
+import square
+import triangle
+import convexpolygon
+import rectangle
+import ellipse
+import importlib
+import numpy
+
+"""
+Author: Thomas Elgin (https://github.com/telgin)
+"""
+
+# the shape modules above register their shape types with shape.registerShape
+
+# scaling the image down significantly reduces computation time and while I would normally
+# be against this sort of thing, for this application you are not generally looking to
+# output an image which includes the very fine detail anyways.
+# ideally, largest image dimension is 315 (sort of tested, sort of arbitrary)
+IDEAL_SIDE_SIZE = 315
+
+
+def loadShapeModule(name):
+    """
+    Imports a module which registers more shape types with shape.registerShape
+    :param name: The module name, which must be importable (for example on the PYTHONPATH)
+    :return: The module
+    """
+    return importlib.import_module(name)
+
+
+def getShapeType(shape):
+    """
+    Looks up a shape type by name. Shape classes are passed through unchanged.
+    :param shape: The name of the shape type or a shape class
+    :return: The shape class
+    """
+    if not isinstance(shape, basestring):
+        return shape
+
+    name = shape.lower()
+    if name not in shapetypes:
+        raise ValueError('Invalid shape type: ' + shape + '. Choose one of the following: ' +
+                         ', '.join(sorted(shapetypes.keys())))
+    return shapetypes[name]
+
+
+def loadImage(image):
+    """
+    Converts an image into the RGB PIL image expected by the model.
+    :param image: A PIL image or a numpy array (height x width x 1, 3, or 4 channels)
+    :return: An RGB PIL image
+    """
+    if isinstance(image, numpy.ndarray):
+        if image.dtype != numpy.uint8:
+            image = numpy.clip(image, 0, 255).astype(numpy.uint8)
+        if image.ndim == 3 and image.shape[2] == 1:
+            image = image[:, :, 0]
+        image = Image.fromarray(image)
+    elif not isinstance(image, Image.Image):
+        raise TypeError('Expected a PIL image or numpy array, got: ' + type(image).__name__)
+
+    # remove alpha component if it exists
+    if image.mode in ('RGBA', 'LA'):
+        noa = Image.new("RGB", image.size, (255, 255, 255))
+        noa.paste(image, mask=image.split()[-1])
+        image = noa
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    return image
+
+
+def scaleFactor(image):
+    """
+    Calculates the scaling factor used to shrink the image before fitting
+    :param image: The PIL image
+    :return: The scaling factor
+    """
+    max_side = max(image.size)
+    if max_side <= IDEAL_SIDE_SIZE:
+        return 1
+    return IDEAL_SIDE_SIZE / float(max_side)
+
+
+def createModel(image):
+    """
+    Creates a model for the given image at the ideal scale
+    :param image: A PIL image or a numpy array
+    :return: The model object
+    """
+    image = loadImage(image)
+    return Model(image, scale=scaleFactor(image))
+
+
+def fitImage(image, savepoints, shape='triangle', cycles=100, startHeat=100, heatDiv=1.1, alpha=.5,
+             parallel=True, verbose=False, refine=0):
+    """
+    Fits shapes to an image without touching the filesystem. Returns a generator which
+    yields a snapshot of the model at each savepoint, so partial results can be used
+    while fitting continues. Use model.toSVG() or model.toPNG() to get the image bytes.
+    :param image: A PIL image or a numpy array
+    :param savepoints: A list of the numbers of shapes to yield at
+    :param shape: The name of the shape type or a shape class
+    :param cycles: The number of cycles (attempts at mutation) per shape
+    :param startHeat: The initial maximum random number which a point can change by
+    :param heatDiv: The amount to divide the heat by every time the shape mutates into a better position
+    :param alpha: The alpha value to use when calculating color
+    :param parallel: Use parallel processing when bestof > 1
+    :param verbose: Print the status of each fitted shape
+    :param refine: The number of refinement passes over the fitted shapes at each savepoint
+    :return: A generator of (number of shapes, model snapshot) at each savepoint
+    """
+    shapetype = getShapeType(shape)
+
+    savepoints = list(savepoints)
+    if len(savepoints) == 0 or min(savepoints) < 1:
+        raise ValueError('Savepoints must be a non-empty list of positive shape counts')
+
+    model = createModel(image)
+
+    # validation happens above, before the first shape is fit
+    fitting = fitShapesIter(model, savepoints, shapetype, cycles, startHeat, heatDiv, alpha,
+                            parallel=parallel, verbose=verbose, refine=refine)
+    return ((count, current.snapshot()) for count, current in fitting)
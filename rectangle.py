@@ -0,0 +1,112 @@
+from shape import ConvexShape, registerShape
+import numpy
+import math
+
+"""
+Author: Thomas Elgin (https://github.com/telgin)
+"""
+
+class RotatedRectangle(ConvexShape):
+    """
+    Rotated rectangle implementation. The shape is stored as parameters
+    [center x, center y, half width, half height, angle] and the points
+    are computed from them.
+    """
+
+    # how far each parameter moves per unit of heat
+    paramScale = numpy.array([1, 1, .5, .5, math.pi / 360])
+
+    def randomizePoints(self):
+        """
+        Randomizes the parameters, essentially creating a new small rectangle
+        somewhere within the bounds of the image
+        """
+
+        startsize = 5
+
+        # pick a random center far enough from the edges for any angle, random size and angle
+        margin = 2 * startsize
+        self.params = numpy.array([self.rng.randint(margin, max(margin, self.imageBounds[0]-margin)+1),
+                                   self.rng.randint(margin, max(margin, self.imageBounds[1]-margin)+1),
+                                   self.rng.randint(2, startsize+1),
+                                   self.rng.randint(2, startsize+1),
+                                   self.rng.random_sample() * math.pi], dtype=float)
+        self.oldParams = numpy.copy(self.params)
+        self.points = self.computePoints(self.params)
+
+        # only needed for images smaller than the margins
+        self.points[:, 0] = numpy.clip(self.points[:, 0], 0, self.imageBounds[0]-1)
+        self.points[:, 1] = numpy.clip(self.points[:, 1], 0, self.imageBounds[1]-1)
+
+    def outline(self, params, t):
+        """
+        Computes points on the outline of the shape before rotation
+        :param params: The shape parameters
+        :param t: An array of angles around the center
+        :return: The x and y offsets from the center
+        """
+        # corners of the rectangle
+        return numpy.sign(numpy.cos(t)) * params[2], numpy.sign(numpy.sin(t)) * params[3]
+
+    def outlineAngles(self):
+        """
+        Gets the angles around the center of the vertices
+        :return: An array of angles
+        """
+        return numpy.array([1, 3, 5, 7]) * math.pi / 4
+
+    def computePoints(self, params, t=None):
+        """
+        Computes the vertices from the parameters by rotating the outline
+        :param params: The shape parameters
+        :param t: The angles around the center, defaults to outlineAngles()
+        :return: The vertices as integers, with repeated neighbors removed
+        """
+        if t is None:
+            t = self.outlineAngles()
+
+        dx, dy = self.outline(params, t)
+        cos, sin = math.cos(params[4]), math.sin(params[4])
+        points = numpy.transpose([params[0] + dx * cos - dy * sin, params[1] + dx * sin + dy * cos])
+        points = numpy.round(points).astype(numpy.int64)
+
+        # small shapes can round several vertices onto the same pixel
+        keep = numpy.any(points != numpy.roll(points, 1, axis=0), axis=1)
+        if keep.any():
+            points = points[keep]
+        return points
+
+    def mutate(self, heat=10):
+        """
+        Redefine mutate to change the parameters rather than individual vertices. A random
+        subset of the parameters is changed at once, trying again if the result leaves the image.
+        :param heat: The length of the range of the random number. The range
+        is centered on the current number.
+        """
+
+        # must have this in order to allow undoMutate
+        self.oldPoints = numpy.copy(self.points)
+        self.oldParams = numpy.copy(self.params)
+
+        for attempt in range(10):
+            changed = self.rng.random_sample(len(self.params)) < .5
+            changed[self.rng.randint(len(self.params))] = True
+
+            params = self.params + changed * (self.rng.random_sample(len(self.params)) - .5) * heat * self.paramScale
+            params[2:4] = numpy.maximum(params[2:4], 1)
+
+            points = self.computePoints(params)
+            if self.pointsBounded(points):
+                self.params = params
+                self.points = points
+                return
+
+    def undoMutate(self):
+        """
+        Undoes the last mutate by restoring the old points and parameters.
+        """
+        self.points = self.oldPoints
+        self.params = self.oldParams
+
+
+registerShape('rectangle', RotatedRectangle)
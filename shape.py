@@ -1,10 +1,51 @@
+from matplotlib import path
 import numpy
 import random
+import math
 
 """
 Author: Thomas Elgin (https://github.com/telgin)
 """
 
+# registry of shape types by name, filled in by the shape modules
+shapetypes = {}
+
+def registerShape(name, shapetype):
+    """
+    Registers a shape type so it can be chosen by name. Plugins call this
+    to add their own shapes.
+    :param name: The name of the shape type
+    :param shapetype: The shape class, which takes the image bounds as its only argument
+    :return: The shape class
+    """
+    shapetypes[name.lower()] = shapetype
+    return shapetype
+
+def tooThin(vertices):
+    """
+    Tells if a shape is too thin, meaning one of its angles is less than 4 degrees
+    :param vertices: The points of the shape
+    :return: True if the shape is too thin, False otherwise
+    """
+    int_vertices = numpy.ndarray.tolist(vertices.astype(numpy.int))
+    for v in range(len(int_vertices)): #I don't know how to do this without a loop
+        p1 = int_vertices[v]
+        p2 = int_vertices[((v+1)%len(int_vertices))]
+        p3 = int_vertices[((v+2)%len(int_vertices))]
+
+        angle = math.degrees(abs(math.atan2(p3[0]-p1[0], p3[1]-p1[1]) -
+                                 math.atan2(p2[0]-p1[0], p2[1]-p1[1])))
+
+        # if > 180, we want the other part
+        if angle > 180:
+            angle = abs(angle-360)
+
+        # all angles must be >= 4 degrees
+        if angle < 4:
+            return True
+
+    return False
+
 class Shape:
     """
     The shape class holds the points of a polygon. It is assumed that the
@@ -85,5 +126,84 @@ class Shape:
         ybounded = (ys >= 0).all() and (ys < self.imageBounds[1]).all()
         return ybounded
 
+    def pixelMask(self, bounds, area=None):
+        """
+        Tells which pixels of a rectangle of the image fall inside the shape. This decides
+        which pixels the shape covers.
+        :param bounds: The coordinates for the rectangle in the image [minx, maxx, miny, maxy]
+        :param area: The number of pixels in the shape's bounding rectangle, if known
+        :return: A 2d logical array the size of the rectangle
+        """
+        x, y = numpy.mgrid[int(bounds[0]):int(bounds[1]), int(bounds[2]):int(bounds[3])]
+        points = numpy.transpose(numpy.vstack([x.ravel(), y.ravel()]))
+        inside = path.Path(self.points).contains_points(points)
+        return numpy.reshape(inside, x.shape)
+
+    def anglePoints(self):
+        """
+        Gets the points whose angles are checked when rejecting shapes which are too thin
+        :return: The points, which are the vertices by default
+        """
+        return self.points
+
     def __str__(self):
-        return str(self.points)
\ No newline at end of file
+        return str(self.points)
+
+
+class ConvexShape(Shape):
+    """
+    Base class for convex shapes. Except for small shapes, pixels are found from the
+    span each row covers instead of a general point in polygon test. Each shape has its own numpy
+    random state (seeded from the random module) for vectorized mutation.
+    """
+
+    # below this bounding rectangle area (pixels) the general point in polygon test is faster
+    spanFillPixels = 500
+
+    def __init__(self, bounds):
+        """
+        Creates a shape and randomizes the points
+        :param bounds: The bounds of the image (max/min values of points)
+        """
+        self.rng = numpy.random.RandomState(random.randint(0, 2**32-1))
+        Shape.__init__(self, bounds)
+
+    def pixelMask(self, bounds, area=None):
+        """
+        Tells which pixels of a rectangle of the image fall inside the shape. A convex shape
+        covers one span of each row, so the ends of the spans are found from all edges at
+        once and the mask is filled by comparing each column with the span of its row.
+        :param bounds: The coordinates for the rectangle in the image [minx, maxx, miny, maxy]
+        :param area: The number of pixels in the shape's bounding rectangle, if known
+        :return: A 2d logical array the size of the rectangle
+        """
+
+        # the general test has less overhead for small shapes. Decide on the shape's own size,
+        # not the rectangle's, so a shape always covers the same pixels.
+        if area is None:
+            size = numpy.ptp(self.points, axis=0) + 1
+            area = size[0] * size[1]
+        if area < self.spanFillPixels:
+            return Shape.pixelMask(self, bounds)
+
+        vertices = numpy.asarray(self.points, dtype=float)
+        following = numpy.roll(vertices, -1, axis=0)
+        rows = numpy.arange(int(bounds[0]), int(bounds[1]), dtype=float)[:, numpy.newaxis]
+        cols = numpy.arange(int(bounds[2]), int(bounds[3]), dtype=float)
+
+        # an edge along a single row needs no span of its own because the edges on either
+        # side of it reach both of its ends, so give it a slope of 0
+        dx = following[:, 0] - vertices[:, 0]
+        dx[dx == 0] = numpy.inf
+        slope = (following[:, 1] - vertices[:, 1]) / dx
+
+        # rows x edges: which edges cross each row, and where
+        crossed = (rows >= numpy.minimum(vertices[:, 0], following[:, 0])) & \
+                  (rows <= numpy.maximum(vertices[:, 0], following[:, 0]))
+        ys = vertices[:, 1] + (rows - vertices[:, 0]) * slope
+
+        low = numpy.where(crossed, ys, numpy.inf).min(axis=1)
+        high = numpy.where(crossed, ys, -numpy.inf).max(axis=1)
+
+        # small tolerance so pixels exactly on an edge are inside
+        return numpy.logical_and(cols >= low[:, numpy.newaxis] - 1e-9, cols <= high[:, numpy.newaxis] + 1e-9)
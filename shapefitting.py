@@ -107,6 +107,7 @@ def bestShapeOfXPar(model, shapetype=Triangle, bestof=10, cycles=100, startHeat=
     pool = multiprocessing.Pool(4)
     partial_func = partial(par_inner, model, shapetype, cycles, startHeat, heatDiv, alpha)
     shapes, changes = zip(*pool.map_async(partial_func, range(0, bestof)).get(9999999)) # timeout to avoid library bug
+    pool.close()
     scores = [change[0] for change in changes]
 
     bestScoreIdx = numpy.argmax(scores)
@@ -114,18 +115,114 @@ def bestShapeOfXPar(model, shapetype=Triangle, bestof=10, cycles=100, startHeat=
     return shapes[bestScoreIdx], changes[bestScoreIdx]
 
 
-def fitShapes(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100, heatDiv=1.01, alpha=.5, savename='polygons'):
+def refineShapes(model, passes=1, cycles=20, startHeat=20, heatDiv=1.1, alpha=.5, verbose=True):
     """
-    Uses the model to fit shapes to an image. SVGs are saved at the numbers of shapes specified, thus
-    the total number of shapes fit will be the max value in the shapes list.
+    Revisits the shapes already in the model. Shapes are fit against the image as it was when they
+    were added, so once later shapes cover them they can usually be improved. For each shape, in order:
+    the shape is removed if the image is no better with it, its color is refit and its vertices are
+    mutated against everything above and below it, and it is moved to the top if that scores better.
+    Every change is scored by re-rendering only the rectangle the shape covers.
     :param model: The model object
-    :param shapes: A list of the numbers of shapes to save at
+    :param passes: The number of times to go over all shapes
+    :param cycles: The number of cycles (attempts at mutation) per shape
+    :param startHeat: The initial maximum random number which a point can change by
+    :param heatDiv: The amount to divide the heat by every time the shape mutates into a better position
+    :param alpha: The alpha value to use when calculating color
+    :param verbose: Print the status after each pass
+    """
+
+    for p in range(passes):
+
+        # bounds of every shape, kept in the same order as the model's shapes
+        boxes = numpy.array([model.shapeBounds(shape) for shape in model.shapes]).reshape([-1, 4])
+        removed = 0
+
+        for shape in list(model.shapes):
+            i = model.shapes.index(shape)
+            bounds = list(boxes[i])
+            current_error = model.regionError(model.current[bounds[0]:bounds[1], bounds[2]:bounds[3], :], bounds)
+
+            # removal: drop the shape if it does not help
+            others = model.shapes[:i] + model.shapes[i+1:]
+            otherBoxes = numpy.delete(boxes, i, 0)
+            region, color = model.renderRegion(bounds, others, otherBoxes)
+            if model.regionError(region, bounds) <= current_error:
+                model.replaceSubsection(region, bounds)
+                model.shapes = others
+                boxes = otherBoxes
+                removed += 1
+                continue
+
+            # refit the color for what is now below the shape
+            region, color = model.renderRegion(bounds, model.shapes, boxes, fitShape=shape, alpha=alpha)
+            error = model.regionError(region, bounds)
+            if color is not None and error < current_error:
+                model.replaceSubsection(region, bounds)
+                shape.color = numpy.ndarray.tolist(color) + [alpha]
+
+            # mutate the vertices, re-rendering the area covered before and after the mutation
+            curHeat = startHeat
+            for j in range(cycles):
+                oldBox = numpy.copy(boxes[i])
+                shape.mutate(heat=curHeat)
+                if model.isThin(shape.anglePoints()):
+                    shape.undoMutate()
+                    continue
+
+                boxes[i] = model.shapeBounds(shape)
+                bounds = [min(oldBox[0], boxes[i][0]), max(oldBox[1], boxes[i][1]),
+                          min(oldBox[2], boxes[i][2]), max(oldBox[3], boxes[i][3])]
+                region, color = model.renderRegion(bounds, model.shapes, boxes, fitShape=shape, alpha=alpha)
+                current_region = model.current[bounds[0]:bounds[1], bounds[2]:bounds[3], :]
+
+                if color is not None and model.regionError(region, bounds) < model.regionError(current_region, bounds):
+                    model.replaceSubsection(region, bounds)
+                    shape.color = numpy.ndarray.tolist(color) + [alpha]
+                    curHeat = int(curHeat / heatDiv)
+                    curHeat = max(curHeat, 2)
+                else:
+                    shape.undoMutate()
+                    boxes[i] = oldBox
+
+            # reinsertion: try the shape at the top of the compositing order
+            if i < len(model.shapes) - 1:
+                bounds = list(boxes[i])
+                moved = model.shapes[:i] + model.shapes[i+1:] + [shape]
+                movedBoxes = numpy.vstack([numpy.delete(boxes, i, 0), boxes[i]])
+                region, color = model.renderRegion(bounds, moved, movedBoxes, fitShape=shape, alpha=alpha)
+                current_region = model.current[bounds[0]:bounds[1], bounds[2]:bounds[3], :]
+
+                if color is not None and model.regionError(region, bounds) < model.regionError(current_region, bounds):
+                    model.replaceSubsection(region, bounds)
+                    shape.color = numpy.ndarray.tolist(color) + [alpha]
+                    model.shapes = moved
+                    boxes = movedBoxes
+
+        # show status
+        if verbose:
+            print 'refining polygons: pass', p+1, '-- removed:', removed, '-- polygons:', len(model.shapes), \
+                '-- image similarity:', model.similarity()*100, '%'
+
+
+def fitShapesIter(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100, heatDiv=1.01, alpha=.5,
+                  parallel=True, verbose=True, refine=0):
+    """
+    Uses the model to fit shapes to an image. This is a generator which yields at the numbers of
+    shapes specified, thus the total number of shapes fit will be the max value in the shapes list.
+    The model yielded is the live model and will keep changing as fitting continues.
+    When refining, shapes which no longer help are dropped, so the model may hold fewer shapes
+    than the number yielded.
+    :param model: The model object
+    :param shapes: A list of the numbers of shapes to yield at
     :param shapetype: The type of shape (class)
     :param cycles: The number of cycles (attempts at mutation) per shape
     :param startHeat: The initial maximum random number which a point can change by
     :param heatDiv: The amount to divide the heat by every time the shape mutates into a better position
     :param alpha: The alpha value to use when calculating color
-    :param savename: The prefix of the SVG file name
+    :param parallel: Use parallel processing when bestof > 1. Must be False inside daemonic processes.
+    :param verbose: Print the status of each fitted shape
+    :param refine: The number of refineShapes passes to run at each savepoint
+    :return: Yields (number of shapes, model) at each savepoint
     """
 
     # From graphing the effect of the bestof param, it was found that
@@ -151,7 +248,7 @@ def fitShapes(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100,
 
         # optimization step:
         # use parallel processing if bestof > 1
-        if bestof > 1:
+        if bestof > 1 and parallel:
             shape, change = bestShapeOfXPar(model, shapetype, bestof, cycles, startHeat, heatDiv, alpha)
         else:
             shape, change = bestShapeOfX(model, shapetype, bestof, cycles, startHeat, heatDiv, alpha)
@@ -159,17 +256,19 @@ def fitShapes(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100,
         # Repeat until a shape is found. This doesn't usually happen,
         while change[0] < 0: # if best score is invalid
 
-            print 'fitting polygon:', i+1, '-- invalid fit, trying again...'
+            if verbose:
+                print 'fitting polygon:', i+1, '-- invalid fit, trying again...'
 
             # optimization step:
             # use parallel processing if bestof > 1
-            if bestof > 1:
+            if bestof > 1 and parallel:
                 shape, change = bestShapeOfXPar(model, shapetype, bestof, cycles, startHeat, heatDiv, alpha)
             else:
                 shape, change = bestShapeOfX(model, shapetype, bestof, cycles, startHeat, heatDiv, alpha)
 
         # show status
-        print 'fitting polygon:', i+1, '-- image similarity:', change[0]*100, '%'
+        if verbose:
+            print 'fitting polygon:', i+1, '-- image similarity:', change[0]*100, '%'
 
         # add the change to the model
         model.replaceSubsection(change[2], change[3])
@@ -183,10 +282,35 @@ def fitShapes(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100,
         # (these will be used to generate the SVG later)
         model.addShape(shape)
 
-        # write an SVG file if the number of shapes is right
+        # hand the model back if the number of shapes is right
         if i+1 in shapes:
-            num = str(i+1)
-            while len(num) < 5:
-                num = '0' + num
+            if refine > 0:
+                refineShapes(model, passes=refine, alpha=alpha, verbose=verbose)
+            yield i+1, model
+
+
+def fitShapes(model, shapes=[1], shapetype=Triangle, cycles=100, startHeat=100, heatDiv=1.01, alpha=.5, savename='polygons',
+              refine=0):
+    """
+    Uses the model to fit shapes to an image. SVGs are saved at the numbers of shapes specified, thus
+    the total number of shapes fit will be the max value in the shapes list.
+    :param model: The model object
+    :param shapes: A list of the numbers of shapes to save at
+    :param shapetype: The type of shape (class)
+    :param cycles: The number of cycles (attempts at mutation) per shape
+    :param startHeat: The initial maximum random number which a point can change by
+    :param heatDiv: The amount to divide the heat by every time the shape mutates into a better position
+    :param alpha: The alpha value to use when calculating color
+    :param savename: The prefix of the SVG file name
+    :param refine: The number of refineShapes passes to run at each savepoint
+    """
+
+    for count, model in fitShapesIter(model, shapes, shapetype, cycles, startHeat, heatDiv, alpha,
+                                      refine=refine):
+
+        # write an SVG file at each savepoint
+        num = str(count)
+        while len(num) < 5:
+            num = '0' + num
 
-            model.writeSVG(savename + '_' + num + '.svg')
+        model.writeSVG(savename + '_' + num + '.svg')
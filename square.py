@@ -1,4 +1,4 @@
-from shape import Shape
+from shape import Shape, registerShape
 import random
 import numpy
 
@@ -91,5 +91,4 @@ class Square(Shape):
             self.points = numpy.transpose([self.points[:, 0] + xmod, self.points[:, 1] + ymod])
 
 
-
-
+registerShape('square', Square)
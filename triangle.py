@@ -1,4 +1,4 @@
-from shape import Shape
+from shape import Shape, registerShape
 import random
 import numpy
 
@@ -33,3 +33,6 @@ class Triangle(Shape):
         xmod2 = self.boundX(random.randint(-modRange, modRange) + self.points[0][0])
         ymod2 = self.boundY(random.randint(-modRange, modRange) + self.points[0][1])
         self.points[2] = [xmod2, ymod2]
+
+
+registerShape('triangle', Triangle)